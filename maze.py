@@ -1,4 +1,15 @@
 import numpy as np
+import array
+import hashlib
+import os
+import tempfile
+
+# goal distance tables already computed, keyed by a hash of the maze walls
+_oracle_cache = dict()
+oracle_cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'maze_oracle')
+
+# frontiers smaller than this are searched cell by cell instead of with array calls
+small_frontier = 256
 
 class Maze(object):
     def __init__(self, filename):
@@ -13,7 +24,12 @@ class Maze(object):
 
         The initialization function also performs some consistency checks for
         wall positioning.
+
+        Derived lookup tables computed from the walls are kept in the tables
+        dictionary so that they can be shared along with the walls.
         '''
+        self.filename = filename
+        self.tables = dict()
         with open(filename, 'rb') as f_in:
 
             # First line should be an integer with the maze dimensions
@@ -91,4 +107,334 @@ class Maze(object):
                 curr_cell[1] += dir_move[direction][1]
             else:
                 sensing = False
-        return distance
\ No newline at end of file
+        return distance
+
+
+    def closed_walls(self):
+        """
+        Returns a uint8 copy of the walls where the outer edges of the maze are
+        always closed, so that array lookups never leave the maze.
+        """
+        dim = self.dim
+        passages = np.array(self.walls, dtype=np.uint8)
+        passages[:, dim-1] &= 15 - 1
+        passages[dim-1, :] &= 15 - 2
+        passages[:, 0] &= 15 - 4
+        passages[0, :] &= 15 - 8
+        return passages
+
+
+    def batch_index(self, cells, directions):
+        """
+        Broadcasts an array of cells, shape (..., 2), against an array of
+        integer directions, 0 for up, 1 for right, 2 for down and 3 for left.
+        Returns the x, y and direction index arrays, with invalid entries
+        replaced by 0, and a boolean array telling which entries are valid.
+        Non-integral values, such as 2.5 or nan, are invalid. An empty list of
+        cells gives empty arrays.
+        """
+        cells = np.asarray(cells)
+        if cells.size == 0:
+            cells = cells.reshape(0, 2)
+        x, x_valid = self.integral(cells[..., 0])
+        y, y_valid = self.integral(cells[..., 1])
+        d, d_valid = self.integral(directions)
+        x, y, d, x_valid, y_valid, d_valid = np.broadcast_arrays(x, y, d, x_valid, y_valid, d_valid)
+        valid = (x_valid & y_valid & d_valid & (d >= 0) & (d < 4) &
+                 (x >= 0) & (x < self.dim) & (y >= 0) & (y < self.dim))
+        return np.where(valid, x, 0), np.where(valid, y, 0), np.where(valid, d, 0), valid
+
+
+    @staticmethod
+    def integral(values):
+        """
+        Returns the values as an integer array, with 0 in place of the values
+        that are not whole numbers, and a boolean array of the whole numbers.
+        """
+        values = np.asarray(values)
+        if np.issubdtype(values.dtype, np.integer):
+            return values, np.ones(values.shape, dtype=bool)
+        if values.dtype == bool or not np.issubdtype(values.dtype, np.number):
+            return np.zeros(values.shape, dtype=np.intp), np.zeros(values.shape, dtype=bool)
+        with np.errstate(invalid='ignore'):
+            whole = np.isfinite(values) & (values == np.floor(values))
+        return np.where(whole, values, 0).astype(np.intp), whole
+
+
+    def are_permissible(self, cells, directions):
+        """
+        Array version of is_permissible. Cells are input as an array of shape
+        (..., 2) and directions as integers, 0 for up, 1 for right, 2 for down
+        and 3 for left. Returns a masked boolean array; entries with an
+        invalid direction or a cell outside the maze are masked.
+        """
+        x, y, d, valid = self.batch_index(cells, directions)
+        permissible = self.walls[x, y] & (1 << d) != 0
+        return np.ma.masked_array(permissible, mask=~valid)
+
+
+    def wall_distance(self):
+        """
+        Returns an array of shape (4, dim, dim) with the number of open cells
+        to the nearest wall from every cell, indexed by the integer directions
+        of are_permissible. The table is computed once and kept in tables.
+        """
+        if 'wall_distance' not in self.tables:
+            dim = self.dim
+            passages = self.closed_walls()
+            distance = np.zeros((4, dim, dim), dtype=np.int32)
+            # every cell extends the run of open cells of its neighbour
+            for y in range(dim-2, -1, -1):
+                distance[0, :, y] = np.where(passages[:, y] & 1, distance[0, :, y+1] + 1, 0)
+            for x in range(dim-2, -1, -1):
+                distance[1, x, :] = np.where(passages[x, :] & 2, distance[1, x+1, :] + 1, 0)
+            for y in range(1, dim):
+                distance[2, :, y] = np.where(passages[:, y] & 4, distance[2, :, y-1] + 1, 0)
+            for x in range(1, dim):
+                distance[3, x, :] = np.where(passages[x, :] & 8, distance[3, x-1, :] + 1, 0)
+            self.tables['wall_distance'] = distance
+        return self.tables['wall_distance']
+
+
+    def dists_to_wall(self, cells, directions):
+        """
+        Array version of dist_to_wall, with the same inputs as are_permissible.
+        Returns a masked array of distances looked up in the wall_distance
+        table.
+        """
+        x, y, d, valid = self.batch_index(cells, directions)
+        return np.ma.masked_array(self.wall_distance()[d, x, y], mask=~valid)
+
+
+    def goal_actions(self):
+        """
+        Returns an array with the least number of tester actions needed to
+        reach the goal from every cell, or -1 where the goal cannot be reached.
+        An action moves up to three squares in a straight line, and any of the
+        four directions can be taken in one action by rotating or moving
+        backwards, so the heading does not change the count. The table is
+        kept in tables and cached, in this process and on disk under the
+        private oracle_cache_dir, keyed by a hash of the maze walls.
+        """
+        if 'goal_actions' in self.tables:
+            return self.tables['goal_actions']
+        walls_bytes = np.ascontiguousarray(self.walls, dtype=np.int64).tobytes()
+        cache_key = hashlib.sha256(str(self.dim) + ':' + walls_bytes).hexdigest()
+        if cache_key not in _oracle_cache:
+            table = self.load_oracle_cache(cache_key)
+            if table is None:
+                table = self.search_goal_actions()
+                self.save_oracle_cache(cache_key, table)
+            _oracle_cache[cache_key] = table
+        self.tables['goal_actions'] = _oracle_cache[cache_key]
+        return self.tables['goal_actions']
+
+
+    @staticmethod
+    def private_cache_dir():
+        """
+        Returns oracle_cache_dir, created readable by the current user only,
+        or None if it cannot be created or is open to other users.
+        """
+        try:
+            if not os.path.isdir(oracle_cache_dir):
+                os.makedirs(oracle_cache_dir, 0o700)
+            stat = os.stat(oracle_cache_dir)
+        except OSError:
+            return None
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            return None
+        return oracle_cache_dir
+
+
+    def load_oracle_cache(self, cache_key):
+        """
+        Returns the goal_actions table saved under cache_key, or None if it is
+        missing or does not hold a (dim, dim) integer table.
+        """
+        cache_dir = self.private_cache_dir()
+        if cache_dir is None:
+            return None
+        cache_file = os.path.join(cache_dir, cache_key + '.npy')
+        if not os.path.exists(cache_file):
+            return None
+        try:
+            table = np.load(cache_file, allow_pickle=False)
+        except (IOError, OSError, ValueError):
+            return None
+        if table.shape != (self.dim, self.dim) or table.dtype != np.int32:
+            return None
+        return table
+
+
+    def save_oracle_cache(self, cache_key, table):
+        cache_dir = self.private_cache_dir()
+        if cache_dir is None:
+            return
+        try:
+            # write to a temporary name first so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+            with os.fdopen(fd, 'wb') as f_out:
+                np.save(f_out, table, allow_pickle=False)
+            os.rename(tmp_path, os.path.join(cache_dir, cache_key + '.npy'))
+        except (IOError, OSError):
+            print 'Could not write the oracle cache to {}'.format(cache_dir)
+
+
+    def search_goal_actions(self):
+        """
+        Breadth first search outwards from the goal, one level per action.
+        Large frontiers are expanded with array operations; small frontiers,
+        as in long corridors, are expanded cell by cell where a few Python
+        operations cost less than the fixed overhead of the array calls.
+        The work is linear in the number of cells, but corridor mazes still
+        need one level per action along the corridor: a 2000x2000 serpentine
+        maze has about 670,000 levels and takes several seconds.
+        """
+        # flat index of cell [x, y] is x * dim + y
+        dim = self.dim
+        size = dim * dim
+        dir_step = [1, dim, -1, -dim]
+
+        # squares that can be crossed in one action, per direction and cell;
+        # the bytearray and array views share their memory with the numpy views
+        reach_bytes = bytearray(np.minimum(self.wall_distance(), 3).astype(np.uint8).tobytes())
+        reach = np.frombuffer(reach_bytes, dtype=np.uint8).reshape(4, size)
+        distance_cells = array.array('i', [-1]) * size
+        distance = np.frombuffer(distance_cells, dtype=np.int32)
+
+        goal = [dim/2 - 1, dim/2]
+        frontier = [x * dim + y for x in goal for y in goal]
+        for cell in frontier:
+            distance_cells[cell] = 0
+        actions = 0
+        while len(frontier):
+            actions += 1
+            if len(frontier) < small_frontier:
+                next_frontier = []
+                for cell in frontier:
+                    for direction, step in enumerate(dir_step):
+                        next_cell = cell
+                        for move in range(reach_bytes[direction * size + cell]):
+                            next_cell += step
+                            if distance_cells[next_cell] < 0:
+                                distance_cells[next_cell] = actions
+                                next_frontier.append(next_cell)
+                frontier = next_frontier
+            else:
+                frontier = np.asarray(frontier)
+                reached = []
+                for direction, step in enumerate(dir_step):
+                    moves = reach[direction, frontier]
+                    for move in range(1, 4):
+                        reached.append(frontier[moves >= move] + step * move)
+                frontier = np.unique(np.concatenate(reached))
+                frontier = frontier[distance[frontier] < 0]
+                distance[frontier] = actions
+                if len(frontier) < small_frontier:
+                    frontier = frontier.tolist()
+
+        return np.array(distance).reshape(dim, dim)
+
+
+    def optimal_actions(self):
+        """
+        Returns the least number of tester actions from the start to the goal,
+        the best possible time of the second run. None if there is no path.
+        """
+        actions = self.goal_actions()[0, 0]
+        if actions < 0:
+            return None
+        return int(actions)
+
+
+    def train_lower_bound(self):
+        """
+        Returns a lower bound on the time of the first run: the robot has to
+        reach the goal and then spend one more step on the reset.
+        """
+        actions = self.optimal_actions()
+        if actions is None:
+            return None
+        return actions + 1
+
+
+    def share(self, path=None, tables=('goal_actions', 'wall_distance')):
+        """
+        Publishes the walls and the derived lookup tables into a shared memory
+        file, by default under /dev/shm. The tables named in tables are built
+        first, with the method of the same name, so that workers never have to
+        build them in their own memory. Returns a SharedMaze handle which can
+        be pickled to worker processes; each worker attaches to the same pages
+        instead of reading and validating the maze file again. The publisher
+        should call unlink on the handle once the workers are done.
+        """
+        for name in tables:
+            getattr(self, name)()
+
+        if path is None:
+            shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+            fd, path = tempfile.mkstemp(prefix='maze_', suffix='.shm', dir=shm_dir)
+            os.close(fd)
+
+        arrays = [(name, np.ascontiguousarray(array)) for name, array in
+                  [('walls', self.walls)] + sorted(self.tables.items())]
+        layout = []
+        offset = 0
+        for name, array in arrays:
+            layout.append((name, array.dtype.str, array.shape, offset))
+            # keep every array aligned on a 64 byte boundary
+            offset += (array.nbytes + 63) // 64 * 64
+
+        buf = np.memmap(path, dtype=np.uint8, mode='w+', shape=(max(offset, 1),))
+        for (name, array), (_, dtype, shape, start) in zip(arrays, layout):
+            buf[start:start + array.nbytes] = array.view(np.uint8).ravel()
+        buf.flush()
+        del buf
+
+        return SharedMaze(path, self.dim, layout, getattr(self, 'filename', None))
+
+
+    @classmethod
+    def attach(cls, shared):
+        """
+        Builds a maze from a SharedMaze handle. The walls and tables are
+        read-only views on the shared memory, no copy is made and no
+        validation is repeated.
+        """
+        maze = cls.__new__(cls)
+        maze.dim = shared.dim
+        maze.filename = shared.filename
+        maze.tables = dict()
+        for name, dtype, shape, offset in shared.layout:
+            array = np.memmap(shared.path, dtype=np.dtype(dtype), mode='r',
+                              offset=offset, shape=shape)
+            if name == 'walls':
+                maze.walls = array
+            else:
+                maze.tables[name] = array
+        return maze
+
+
+class SharedMaze(object):
+    def __init__(self, path, dim, layout, filename=None):
+        '''
+        Handle on a maze published with Maze.share. It only holds the path of
+        the shared memory file, the maze dimension and the (name, dtype, shape,
+        offset) layout of the arrays, so it is cheap to pickle.
+        '''
+        self.path = path
+        self.dim = dim
+        self.layout = layout
+        self.filename = filename
+
+    def attach(self):
+        return Maze.attach(self)
+
+    def unlink(self):
+        """
+        Removes the shared memory file. Workers already attached keep their
+        mapping until they exit.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,214 @@
+from maze import Maze
+from robot import Robot
+from tester import Simulator, max_time
+import numpy as np
+import os
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 only has tracemalloc with the pytracemalloc backport
+    tracemalloc = None
+
+# maze sizes of the scaling table
+scaling_dims = [12, 16, 32, 64, 128, 256, 512, 1024]
+
+
+def deep_size(obj, seen=None):
+    '''
+    Size in bytes of an object and everything it refers to through dictionaries,
+    lists, tuples and sets. Numpy arrays count their data buffer.
+    Objects already in seen are not counted again.
+    '''
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen)
+    return size
+
+
+def structure_sizes(robot, maze):
+    '''
+    Bytes held by each of the large structures of a robot and its maze
+    :return: [(structure, bytes)]
+    '''
+    return [('q table', deep_size(robot.Q_dict)),
+            ('exploration', deep_size([robot.t_dict, robot.dead_end_list,
+                                       robot.known_open, robot.known_wall])),
+            ('traces', deep_size(robot.trace_list)),
+            ('maze', deep_size([maze.walls, maze.tables]))]
+
+
+def synthetic_maze(dim):
+    '''
+    Maze with the same arrays as one read from a file, without the file.
+    The oracle and distance tables are built as a tester run would.
+    '''
+    maze = Maze.__new__(Maze)
+    maze.dim = dim
+    maze.filename = None
+    maze.walls = np.zeros((dim, dim), dtype=np.array([0]).dtype)
+    maze.tables = dict()
+    maze.goal_actions()
+    maze.wall_distance()
+    return maze
+
+
+class MemoryReport(object):
+    def __init__(self, maze):
+        '''
+        Runs one episode of the robot in the maze and takes memory snapshots
+        after the robot is built, when it first hits the goal in the first run,
+        and at the end of every run. The end of the first run is taken just
+        before the robot clears its run state for the reset. tracemalloc
+        snapshots are taken when it is available, the bytes per structure are
+        always measured.
+        '''
+        self.maze = maze
+        self.rows = []
+        self.snapshots = []
+
+    def snapshot(self, label, robot):
+        traced = None
+        if tracemalloc is not None:
+            traced = tracemalloc.get_traced_memory()
+            self.snapshots.append((label, tracemalloc.take_snapshot()))
+        self.rows.append((label, structure_sizes(robot, self.maze), traced))
+
+    def run(self):
+        if tracemalloc is not None:
+            tracemalloc.start()
+        # the robot prints every step, only the report should be shown
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            self.run_episode()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        if tracemalloc is not None:
+            tracemalloc.stop()
+        return self.rows
+
+    def run_episode(self):
+        robot = Robot(self.maze.dim)
+        self.snapshot('construction', robot)
+        simulator = Simulator(self.maze, robot)
+
+        # snapshot the end of the first run before reset_run clears the trace
+        reset_run = robot.reset_run
+        def snapshot_and_reset():
+            self.snapshot('end of run {}'.format(len(simulator.runtimes)), robot)
+            reset_run()
+        robot.reset_run = snapshot_and_reset
+
+        goal_bounds = [self.maze.dim/2 - 1, self.maze.dim/2]
+        goal_hit = False
+        for event in simulator.steps():
+            if (not goal_hit and event.run == 0 and
+                    event.location[0] in goal_bounds and event.location[1] in goal_bounds):
+                goal_hit = True
+                self.snapshot('mid-run (goal)', robot)
+            if len(simulator.runtimes) == 2:
+                self.snapshot('end of run 1', robot)
+        if not goal_hit:
+            self.rows.append(('mid-run (goal)', None, None))
+        if len(simulator.runtimes) < 2:
+            self.snapshot('end of episode', robot)
+
+    def report(self):
+        print "Memory of a robot in a {0}x{0} maze (KiB)".format(self.maze.dim)
+        names = [name for name, size in self.rows[0][1]]
+        header = "{:<16}".format('') + "".join("{:>14}".format(name) for name in names)
+        if tracemalloc is not None:
+            header += "{:>14}{:>14}".format('traced', 'peak')
+        print header
+        for label, sizes, traced in self.rows:
+            if sizes is None:
+                print "{:<16}skipped, the robot did not reach the goal".format(label)
+                continue
+            line = "{:<16}".format(label) + "".join("{:>14.1f}".format(size / 1024.) for name, size in sizes)
+            if traced is not None:
+                line += "{:>14.1f}{:>14.1f}".format(traced[0] / 1024., traced[1] / 1024.)
+            print line
+
+        if len(self.snapshots) > 1:
+            print "Largest allocations since construction:"
+            first, last = self.snapshots[0][1], self.snapshots[-1][1]
+            for stat in last.compare_to(first, 'lineno')[:5]:
+                print "  {}".format(stat)
+        elif tracemalloc is None:
+            print "tracemalloc is not available, traced totals are not reported."
+
+
+def trace_entry_size():
+    '''
+    Bytes added to the trace list by one step of the robot: the entry and its list slot
+    '''
+    entry = ([0, 0], 'u', 2, 90, 'r', 1)
+    return deep_size(entry) + np.dtype(np.intp).itemsize
+
+
+def scaling_table(dims=scaling_dims, measure_limit=128):
+    '''
+    Bytes per structure right after robot construction for every maze size.
+    Sizes above measure_limit are extrapolated from the largest measured size,
+    every structure grows with the number of cells. Traces are given for a
+    full time budget of steps as they do not depend on the maze size.
+    :return: [(dim, [(structure, bytes)], estimated)]
+    '''
+    table = []
+    measured = None
+    for dim in dims:
+        if dim <= measure_limit:
+            robot = Robot(dim)
+            sizes = structure_sizes(robot, synthetic_maze(dim))
+            measured = (dim, sizes)
+            estimated = False
+        else:
+            scale = (dim * 1.0 / measured[0]) ** 2
+            sizes = [(name, int(size * scale)) for name, size in measured[1]]
+            estimated = True
+        sizes = [(name, trace_entry_size() * max_time if name == 'traces' else size)
+                 for name, size in sizes]
+        table.append((dim, sizes, estimated))
+    return table
+
+
+def print_scaling_table(table):
+    print "Memory per robot after construction (MiB), traces for {} steps".format(max_time)
+    names = [name for name, size in table[0][1]]
+    print "{:>6}".format('dim') + "".join("{:>14}".format(name) for name in names) + "{:>14}".format('total')
+    for dim, sizes, estimated in table:
+        line = "{:>6}".format(dim) + "".join("{:>14.2f}".format(size / 1048576.) for name, size in sizes)
+        line += "{:>14.2f}".format(sum(size for name, size in sizes) / 1048576.)
+        if estimated:
+            line += "  (est)"
+        print line
+
+
+if __name__ == '__main__':
+    '''
+    This script reports where the memory of a robot goes: the bytes held by
+    each structure over one episode in the maze given as an argument, and how
+    they scale with the maze size.
+    '''
+    testmaze = Maze(sys.argv[1] if len(sys.argv) > 1 else "test_maze_01.txt")
+
+    memory_report = MemoryReport(testmaze)
+    memory_report.run()
+    table = scaling_table()
+
+    memory_report.report()
+    print_scaling_table(table)
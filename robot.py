@@ -12,6 +12,8 @@ dir_move = {'u': [0, 1], 'r': [1, 0], 'd': [0, -1], 'l': [-1, 0],
             'up': [0, 1], 'right': [1, 0], 'down': [0, -1], 'left': [-1, 0]}
 dir_reverse = {'u': 'd', 'r': 'l', 'd': 'u', 'l': 'r',
                'up': 'd', 'right': 'l', 'down': 'u', 'left': 'r'}
+dir_bit = {'u': 1, 'r': 2, 'd': 4, 'l': 8,
+           'up': 1, 'right': 2, 'down': 4, 'left': 8}
 dir_rotation_heading = {90: [('l', 'u'), ('r', 'd'), ('u', 'r'), ('d', 'l'),
                              ('left', 'u'), ('right', 'd'), ('up', 'r'), ('down', 'l')],
                         -90: [('l', 'd'), ('r', 'u'), ('u', 'l'), ('d', 'r'),
@@ -118,19 +120,211 @@ class Score(object):
         return self.reward
 
 
-class Robot(TraceBack, Score):
-    def __init__(self, maze_dim):
+class Explore(object):
+    def __init__(self, maze_dim, early_reset=False, explore_limit=None):
+        '''
+        explore_limit is the number of steps after which an early reset happens
+        even though the known path is not proven to be the shortest. It is off by
+        default as such a reset can lock a poor route in for the next run.
+
+        The wall knowledge uses the same 4-bit coding as the maze walls: 1 for the
+        top edge, 2 for the right edge, 4 for the bottom edge and 8 for the left edge.
+        A bit set in known_open proves a passage, a bit set in known_wall proves a wall,
+        an edge with neither bit set is unknown.
+        '''
+        self.maze_dim = maze_dim
+        self.early_reset = early_reset
+        self.explore_limit = explore_limit
+        self.exploring = True
+        self.hit_goal = False
+        self.route = []
+        self.known_open = np.zeros((maze_dim, maze_dim), dtype=np.uint8)
+        self.known_wall = np.zeros((maze_dim, maze_dim), dtype=np.uint8)
+        # the outer walls of the maze are always known
+        self.known_wall[:, maze_dim-1] |= dir_bit['u']
+        self.known_wall[maze_dim-1, :] |= dir_bit['r']
+        self.known_wall[:, 0] |= dir_bit['d']
+        self.known_wall[0, :] |= dir_bit['l']
+
+    def record_walls(self, location, heading, sensors):
+        '''
+        Record the walls seen by the sensors around the current location.
+        A sensor reading of d proves d open passages and a wall at the end of the ray.
+        An edge already proven the other way is never changed, so no edge is both open and a wall.
+        :return:
+        '''
+        for idx, sensor_heading in enumerate(dir_sensors[heading]):
+            distance = sensors[idx]
+            step_x, step_y = dir_move[sensor_heading]
+            forward = np.uint8(dir_bit[sensor_heading])
+            backward = np.uint8(dir_bit[dir_reverse[sensor_heading]])
+            ray = np.arange(distance + 1)
+            ray_x = location[0] + step_x * ray
+            ray_y = location[1] + step_y * ray
+            # every cell but the last is open forwards, every cell but the first is open backwards
+            self.known_open[ray_x[:-1], ray_y[:-1]] |= forward & ~self.known_wall[ray_x[:-1], ray_y[:-1]]
+            self.known_open[ray_x[1:], ray_y[1:]] |= backward & ~self.known_wall[ray_x[1:], ray_y[1:]]
+            wall_loc = (ray_x[-1], ray_y[-1])
+            self.known_wall[wall_loc] |= forward & ~self.known_open[wall_loc]
+            next_loc = (wall_loc[0] + step_x, wall_loc[1] + step_y)
+            if self.in_maze(next_loc):
+                self.known_wall[next_loc] |= backward & ~self.known_open[next_loc]
+
+    def in_maze(self, location):
+        return 0 <= location[0] < self.maze_dim and 0 <= location[1] < self.maze_dim
+
+    def edge_state(self, location, heading):
+        '''
+        :return: True if the edge is known to be open, False if it is known to be a wall, None if unknown
+        '''
+        location = tuple(location)
+        if self.known_open[location] & dir_bit[heading]:
+            return True
+        if self.known_wall[location] & dir_bit[heading]:
+            return False
+        return None
+
+    def known_distance(self, location, heading, limit=3):
+        '''
+        :return: number of passages known to be open from the location in the heading, up to the limit
+        '''
+        distance = 0
+        location = list(location)
+        while distance < limit and self.known_open[tuple(location)] & dir_bit[heading]:
+            location[0] += dir_move[heading][0]
+            location[1] += dir_move[heading][1]
+            distance += 1
+        return distance
+
+    def known_fraction(self):
+        '''
+        :return: fraction of the inner edges of the maze whose state is known
+        '''
+        inner_edges = 2 * self.maze_dim * (self.maze_dim - 1)
+        known = self.known_open | self.known_wall
+        known_edges = np.count_nonzero(known[:, :-1] & dir_bit['u']) + np.count_nonzero(known[:-1, :] & dir_bit['r'])
+        return known_edges * 1.0 / inner_edges
+
+    def shortest_route(self, passable):
+        '''
+        Breadth first search for the least number of moves from the start to the goal zone,
+        every move goes up to three squares in a straight line.
+        Heading does not matter as any of the four directions can be reached in one move
+        by rotating or moving backwards.
+        :param passable: function of location and heading telling if the edge can be crossed
+        :return: the locations where every move ends, from the start to the goal zone,
+                 or None if the goal can not be reached
+        '''
+        goal_set = set(tuple(loc) for loc in self.goal_loc)
+        parent = {(0, 0): None}
+        frontier = [(0, 0)]
+        while frontier:
+            next_frontier = []
+            for location in frontier:
+                if location in goal_set:
+                    route = []
+                    while location is not None:
+                        route.insert(0, location)
+                        location = parent[location]
+                    return route
+                for heading in ['u', 'r', 'd', 'l']:
+                    next_loc = location
+                    for move in [1, 2, 3]:
+                        if not passable(next_loc, heading):
+                            break
+                        next_loc = (next_loc[0] + dir_move[heading][0], next_loc[1] + dir_move[heading][1])
+                        if next_loc not in parent:
+                            parent[next_loc] = location
+                            next_frontier += [next_loc]
+            frontier = next_frontier
+        return None
+
+    def min_actions(self, passable):
+        '''
+        :return: number of moves of the shortest route, or None if the goal can not be reached
+        '''
+        route = self.shortest_route(passable)
+        if route is None:
+            return None
+        return len(route) - 1
+
+    def known_passable(self, location, heading):
+        return self.edge_state(location, heading) is True
+
+    def exploration_complete(self):
+        '''
+        Check if the shortest path through the known open passages can not be beaten
+        by any path going through the unknown passages
+        :return: True or False
+        '''
+        known_moves = self.min_actions(self.known_passable)
+        if known_moves is None:
+            return False
+        optimistic_moves = self.min_actions(lambda location, heading: self.edge_state(location, heading) is not False)
+        logging.info("known %.3f, known moves %d, optimistic moves %d" % (self.known_fraction(), known_moves, optimistic_moves))
+        return known_moves <= optimistic_moves
+
+    def should_reset(self):
+        '''
+        Reset the first run once the goal has been hit and the known path is proven
+        to be the shortest, or once the explore limit is reached if there is one
+        :return: True or False
+        '''
+        if not (self.early_reset and self.exploring and self.hit_goal):
+            return False
+        if self.explore_limit is not None and self.step >= self.explore_limit:
+            return True
+        return self.exploration_complete()
+
+    def reset_run(self):
+        '''
+        Put the robot back at the start, the tester does the same after a reset.
+        The junction marks and trace of the first run are cleared, the Q values and
+        the wall knowledge are kept. The shortest route through the known open
+        passages is stored to be followed in the next run in the early reset mode
+        :return:
+        '''
+        self.exploring = False
+        route = self.shortest_route(self.known_passable)
+        self.route = route[1:] if route else []
+        self.location = [0, 0]
+        self.heading = 'up'
+        self.reset_dead_end_traceback()
+        self.reset_traceback()
+        self.build_t_dict()
+
+    def follow_route(self):
+        '''
+        Make the next move of the stored route, each move is a straight line
+        :return: rotation, movement
+        '''
+        next_loc = self.route.pop(0)
+        step = [cmp(next_loc[0], self.location[0]), cmp(next_loc[1], self.location[1])]
+        heading = [move_heading for move_heading in ['u', 'r', 'd', 'l'] if dir_move[move_heading] == step][0]
+        distance = abs(next_loc[0] - self.location[0]) + abs(next_loc[1] - self.location[1])
+        movement, rotation = self.decide_move_n_rotation(heading, distance)
+        self.heading, self.location = self.update_location(self.heading, self.location, movement, heading)
+        self.step += 1
+        return rotation, movement
+
+
+class Robot(TraceBack, Score, Explore):
+    def __init__(self, maze_dim, early_reset=False, explore_limit=None):
         '''
         Use the initialization function to set up attributes that your robot
         will use to learn and navigate the maze. Some initial attributes are
         provided based on common information, including the size of the maze
         the robot is placed in.
+
+        With early_reset the robot keeps exploring after hitting the goal and
+        only resets once the known path to the goal is proven to be the shortest,
+        or after explore_limit steps if it is given.
         '''
         TraceBack.__init__(self)
         Score.__init__(self)
+        Explore.__init__(self, maze_dim, early_reset, explore_limit)
         self.location = [0, 0]
         self.heading = 'up'
-        self.maze_dim = maze_dim
         self.goal_loc = [[self.maze_dim/2-1, self.maze_dim/2-1],
                          [self.maze_dim/2, self.maze_dim/2-1],
                          [self.maze_dim/2-1, self.maze_dim/2],
@@ -256,14 +450,15 @@ class Robot(TraceBack, Score):
         else:
             return False
 
-    def next_pos_move(self, sensors):
+    def next_pos_move(self):
         '''
-        Use this function to determine the possible next move
+        Use this function to determine the possible next move from the wall knowledge,
+        the sensors must already be recorded
         :return:
         '''
         dir_possible = dict()
-        for idx, possible_heading in enumerate(dir_sensors[self.heading]):
-            wall_distance = sensors[idx]
+        for possible_heading in dir_sensors[self.heading]:
+            wall_distance = self.known_distance(self.location, possible_heading)
             if wall_distance != 0:
                 logging.info("+++pos h:" + possible_heading + "|||wal d:" + str(wall_distance))
                 dir_possible[possible_heading] = min(wall_distance, 3)
@@ -419,12 +614,29 @@ class Robot(TraceBack, Score):
         #     return "Reset", "Reset"
         logging.info("### %s %d" % (str(self.location), self.step))
         print self.location
-        dir_possible = self.next_pos_move(sensors)
+        self.record_walls(self.location, self.heading, sensors)
+        dir_possible = self.next_pos_move()
         valid_dir = dir_possible.copy()
 
+        # follow the known shortest route after an early reset
+        if self.early_reset and not self.exploring and self.route:
+            logging.info("ROUTE")
+            return self.follow_route()
+
+        # keep exploring after the goal until the known path is the shortest one
+        if self.early_reset:
+            if self.location in self.goal_loc:
+                logging.info("GOAL")
+                self.hit_goal = True
+            if self.should_reset():
+                logging.info("EARLY RESET")
+                print "EARLY RESET"
+                self.reset_run()
+                return "Reset", "Reset"
+
         # rest_step = self.train_deadline - self.move
         # check for goal entered
-        if self.location in self.goal_loc:
+        elif self.location in self.goal_loc:
         # if self.location[0] in goal_bounds and self.location[1] in goal_bounds:
             logging.info("GOAL")
             print "GOAL"
@@ -434,6 +646,7 @@ class Robot(TraceBack, Score):
             print "Test %d" % self.test
             self.move = 0
             self.update_Q_dict(dir_possible, goal=True)
+            self.reset_run()
             return "Reset", "Reset"
         #
         # if self.move >= self.train_deadline:
@@ -473,13 +686,13 @@ class Robot(TraceBack, Score):
         #
             # else:
             # print '---', self.location
-        if sensors.count(0) == 3:
+        if not dir_possible:
             logging.info("#dead end")
             self.dead_end = True
 
         # joint location
         # can only move one step every time
-        elif sensors.count(0) <= 1:
+        elif len(dir_possible) >= 2:
             logging.info("#joint location")
             logging.info(self.t_dict[tuple(self.location)])
             print "#joint location"
@@ -544,7 +757,7 @@ class Robot(TraceBack, Score):
                 #     print "-------", dir_possible
                 #     self.update_Q_dict(dir_possible, repeat=True)
                 # else:
-                self.update_Q_dict(valid_dir)
+                self.update_Q_dict(valid_dir, goal=self.location in self.goal_loc)
             else:
                 self.remove_action(valid_dir)
 
@@ -1,59 +1,200 @@
 from maze import Maze
+from tester import dir_sensors, dir_move, dir_reverse
 import turtle
+import time
 import sys
 
+# turtle headings of the robot directions
+dir_angle = {'u': 90, 'r': 0, 'd': 270, 'l': 180,
+             'up': 90, 'right': 0, 'down': 270, 'left': 180}
+
+
+class MazeViewer(object):
+    def __init__(self, maze, sq_size=20, delay=0, frame_skip=False, fps=30):
+        '''
+        Draws the maze once and then follows a robot through the step events
+        of a Simulator or a recorded list of them, redrawing only what changed:
+        the robot pose, the newly visited cells and the walls newly proven by
+        the sensor readings of the events.
+
+        delay is the pause in seconds after every drawn step. With frame_skip
+        the events are only collected and the screen is redrawn at most fps
+        times per second, so fast simulations are not slowed down by drawing.
+        '''
+        self.maze = maze
+        self.sq_size = sq_size
+        self.delay = delay
+        self.frame_skip = frame_skip
+        self.fps = fps
+
+        # maze centered on (0,0)
+        self.origin = maze.dim * sq_size / -2
+
+        # Intialize the window and drawing turtles, drawing is flushed manually.
+        self.window = turtle.Screen()
+        self.window.tracer(0, 0)
+        self.wally = self.make_pen('black')
+        self.marker = self.make_pen('light gray')
+        self.prover = self.make_pen('red')
+        self.bot = turtle.Turtle()
+        self.bot.shape('turtle')
+        self.bot.color('blue')
+        self.bot.penup()
+
+        self.visited = set()
+        self.pending_visits = []
+        self.proven_walls = set()
+        self.pending_walls = []
+        self.event = None
+        # the sensors of an event are read at the pose before its action
+        self.run = 0
+        self.sensed_pose = ((0, 0), 'up')
+        self.last_render = 0
+
+        self.draw_maze()
+        self.render()
+
+    @staticmethod
+    def make_pen(color):
+        pen = turtle.Turtle()
+        pen.speed(0)
+        pen.hideturtle()
+        pen.penup()
+        pen.color(color)
+        return pen
+
+    def cell_center(self, location):
+        return (self.origin + self.sq_size * (location[0] + 0.5),
+                self.origin + self.sq_size * (location[1] + 0.5))
+
+    def draw_edge(self, pen, location, direction):
+        '''
+        Draw one edge of a square
+        '''
+        x, y = location
+        if direction in ['u', 'up']:
+            pen.goto(self.origin + self.sq_size * x, self.origin + self.sq_size * (y+1))
+            pen.setheading(0)
+        elif direction in ['r', 'right']:
+            pen.goto(self.origin + self.sq_size * (x+1), self.origin + self.sq_size * y)
+            pen.setheading(90)
+        elif direction in ['d', 'down']:
+            pen.goto(self.origin + self.sq_size * x, self.origin + self.sq_size * y)
+            pen.setheading(0)
+        else:
+            pen.goto(self.origin + self.sq_size * x, self.origin + self.sq_size * y)
+            pen.setheading(90)
+        pen.pendown()
+        pen.forward(self.sq_size)
+        pen.penup()
+
+    def draw_maze(self):
+        # iterate through squares one by one to decide where to draw walls
+        for x in range(self.maze.dim):
+            for y in range(self.maze.dim):
+                if not self.maze.is_permissible([x,y], 'up'):
+                    self.draw_edge(self.wally, (x, y), 'up')
+
+                if not self.maze.is_permissible([x,y], 'right'):
+                    self.draw_edge(self.wally, (x, y), 'right')
+
+                # only check bottom wall if on lowest row
+                if y == 0 and not self.maze.is_permissible([x,y], 'down'):
+                    self.draw_edge(self.wally, (x, y), 'down')
+
+                # only check left wall if on leftmost column
+                if x == 0 and not self.maze.is_permissible([x,y], 'left'):
+                    self.draw_edge(self.wally, (x, y), 'left')
+
+    def update(self, event):
+        '''
+        Take in a step event, the drawing happens in render
+        '''
+        if event.run != self.run:
+            self.run = event.run
+            self.sensed_pose = ((0, 0), 'up')
+        self.prove_walls(self.sensed_pose[0], self.sensed_pose[1], event.sensors)
+        self.sensed_pose = (event.location, event.heading)
+
+        self.event = event
+        if event.location not in self.visited:
+            self.visited.add(event.location)
+            self.pending_visits += [event.location]
+
+    def prove_walls(self, location, heading, sensors):
+        '''
+        A sensor reading of d proves a wall d squares away in the sensor direction.
+        Walls are kept as the top or right edge of a square so that each one is
+        drawn once; the outer walls are drawn with the maze.
+        '''
+        for sensor_heading, distance in zip(dir_sensors[heading], sensors):
+            x = location[0] + dir_move[sensor_heading][0] * distance
+            y = location[1] + dir_move[sensor_heading][1] * distance
+            if sensor_heading in ['d', 'l']:
+                x += dir_move[sensor_heading][0]
+                y += dir_move[sensor_heading][1]
+                sensor_heading = dir_reverse[sensor_heading]
+            if x < 0 or y < 0:
+                continue
+            if sensor_heading == 'u' and y == self.maze.dim - 1:
+                continue
+            if sensor_heading == 'r' and x == self.maze.dim - 1:
+                continue
+            if ((x, y), sensor_heading) not in self.proven_walls:
+                self.proven_walls.add(((x, y), sensor_heading))
+                self.pending_walls += [((x, y), sensor_heading)]
+
+    def render(self):
+        '''
+        Draw the changes since the last render and flush them to the screen
+        '''
+        for location in self.pending_visits:
+            self.marker.goto(self.cell_center(location))
+            self.marker.dot(self.sq_size / 4)
+        self.pending_visits = []
+        for location, direction in self.pending_walls:
+            self.draw_edge(self.prover, location, direction)
+        self.pending_walls = []
+        if self.event is not None:
+            self.bot.goto(self.cell_center(self.event.location))
+            self.bot.setheading(dir_angle[self.event.heading])
+        self.window.update()
+        self.last_render = time.time()
+
+    def play(self, events):
+        '''
+        Follow an iterable of step events, either a running Simulator.steps()
+        or a recorded list of events
+        '''
+        for event in events:
+            self.update(event)
+            if not self.frame_skip:
+                self.render()
+                if self.delay:
+                    time.sleep(self.delay)
+            elif time.time() - self.last_render >= 1.0 / self.fps:
+                self.render()
+        self.render()
+
+
 if __name__ == '__main__':
     '''
     This function uses Python's turtle library to draw a picture of the maze
-    given as an argument when running the script.
+    given as an argument when running the script. With the 'live' argument
+    the robot in robot.py is run through the maze and followed.
     '''
 
     # Create a maze based on input argument on command line.
     #testmaze = Maze( str(sys.argv[1]) )
     testmaze = Maze("test_maze_01.txt")
 
-    # Intialize the window and drawing turtle.
-    window = turtle.Screen()
-    wally = turtle.Turtle()
-    wally.speed(0)
-    wally.hideturtle()
-    wally.penup()
-
-    # maze centered on (0,0), squares are 20 units in length.
-    sq_size = 20
-    origin = testmaze.dim * sq_size / -2
-
-    # iterate through squares one by one to decide where to draw walls
-    for x in range(testmaze.dim):
-        for y in range(testmaze.dim):
-            if not testmaze.is_permissible([x,y], 'up'):
-                wally.goto(origin + sq_size * x, origin + sq_size * (y+1))
-                wally.setheading(0)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-            if not testmaze.is_permissible([x,y], 'right'):
-                wally.goto(origin + sq_size * (x+1), origin + sq_size * y)
-                wally.setheading(90)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-            # only check bottom wall if on lowest row
-            if y == 0 and not testmaze.is_permissible([x,y], 'down'):
-                wally.goto(origin + sq_size * x, origin)
-                wally.setheading(0)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-            # only check left wall if on leftmost column
-            if x == 0 and not testmaze.is_permissible([x,y], 'left'):
-                wally.goto(origin, origin + sq_size * y)
-                wally.setheading(90)
-                wally.pendown()
-                wally.forward(sq_size)
-                wally.penup()
-
-    window.exitonclick()
\ No newline at end of file
+    if 'live' in sys.argv[1:]:
+        from robot import Robot
+        from tester import Simulator
+        testrobot = Robot(testmaze.dim)
+        viewer = MazeViewer(testmaze, frame_skip=True)
+        viewer.play(Simulator(testmaze, testrobot).steps())
+    else:
+        viewer = MazeViewer(testmaze)
+
+    viewer.window.exitonclick()
@@ -1,5 +1,6 @@
 from maze import Maze
 from robot import Robot
+from collections import namedtuple
 import sys
 
 # global dictionaries for robot movement and sensing
@@ -16,10 +17,147 @@ dir_reverse = {'u': 'd', 'r': 'l', 'd': 'u', 'l': 'r',
 max_time = 1000
 train_score_mult = 1/30.
 
+# one event per time step; location and heading are the pose after the action,
+# sensors are the readings the robot acted on
+StepEvent = namedtuple('StepEvent', ['time', 'run', 'location', 'heading', 'sensors',
+                                     'rotation', 'movement', 'wall_stop'])
+
+
+class Simulator(object):
+    def __init__(self, maze, robot, max_time=max_time, verbose=False):
+        '''
+        Runs a robot through the two runs of a maze under the tester rules.
+        Iterate over steps() to advance the simulation; the run times are
+        collected in runtimes and the final score is available from score().
+        With verbose the tester messages are printed as the simulation goes.
+        A simulator runs once: the robot keeps what it learned, so another
+        episode needs a new simulator and a new robot.
+        '''
+        self.started = False
+        self.maze = maze
+        self.robot = robot
+        self.max_time = max_time
+        self.verbose = verbose
+        self.runtimes = []
+        self.total_time = 0
+        self.goal_bounds = [maze.dim/2 - 1, maze.dim/2]
+
+    def report(self, message):
+        if self.verbose:
+            print message
+
+    def score(self):
+        """
+        Returns the score of the robot, or None if it did not complete both runs.
+        """
+        if len(self.runtimes) == 2:
+            return self.runtimes[1] + train_score_mult*self.runtimes[0]
+
+    def best_score(self):
+        """
+        Returns the lowest score any robot can reach in the maze: the optimal
+        number of actions in the second run plus the lower bound on the first
+        run. None if the goal cannot be reached.
+        """
+        if self.maze.optimal_actions() is None:
+            return None
+        return self.maze.optimal_actions() + train_score_mult*self.maze.train_lower_bound()
+
+    def steps(self):
+        """
+        Returns a generator yielding a StepEvent for every time step of the
+        simulation, including the steps spent on reset requests. Raises if the
+        simulation was already started.
+        """
+        if self.started:
+            raise Exception('Simulator already run, create a new one for another episode!')
+        self.started = True
+        return self.step_events()
+
+    def step_events(self):
+        for run in range(2):
+            self.report("Starting run {}.".format(run))
+
+            # Set the robot in the start position. Note that robot position
+            # parameters are independent of the robot itself.
+            location = [0, 0]
+            heading = 'up'
+
+            hit_goal = False
+            while True:
+                # check for end of time
+                self.total_time += 1
+                if self.total_time > self.max_time:
+                    self.report("Allotted time exceeded.")
+                    break
+
+                # provide robot with sensor information, get actions
+                sensing = [self.maze.dist_to_wall(location, sensor_heading)
+                           for sensor_heading in dir_sensors[heading]]
+                rotation, movement = self.robot.next_move(sensing)
+
+                # check for a reset
+                if (rotation, movement) == ('Reset', 'Reset'):
+                    if run == 0 and hit_goal:
+                        self.runtimes.append(self.total_time)
+                        self.report("Ending first run. Starting next run.")
+                        yield StepEvent(self.total_time, run, tuple(location), heading,
+                                        tuple(sensing), rotation, movement, False)
+                        break
+                    elif run == 0 and not hit_goal:
+                        self.report("Cannot reset - robot has not hit goal yet.")
+                    else:
+                        self.report("Cannot reset on runs after the first.")
+                    yield StepEvent(self.total_time, run, tuple(location), heading,
+                                    tuple(sensing), rotation, movement, False)
+                    continue
+
+                # perform rotation
+                if rotation == -90:
+                    heading = dir_sensors[heading][0]
+                elif rotation == 90:
+                    heading = dir_sensors[heading][2]
+                elif rotation == 0:
+                    pass
+                else:
+                    self.report("Invalid rotation value, no rotation performed.")
+
+                # perform movement
+                if abs(movement) > 3:
+                    self.report("Movement limited to three squares in a turn.")
+                steps = max(min(int(movement), 3), -3) # fix to range [-3, 3]
+                move_heading = heading if steps > 0 else dir_reverse[heading]
+                wall_stop = False
+                while steps:
+                    if self.maze.is_permissible(location, move_heading):
+                        location[0] += dir_move[move_heading][0]
+                        location[1] += dir_move[move_heading][1]
+                        steps -= 1 if steps > 0 else -1
+                    else:
+                        self.report("Movement stopped by wall.")
+                        wall_stop = True
+                        steps = 0
+
+                # check for goal entered
+                run_complete = False
+                if location[0] in self.goal_bounds and location[1] in self.goal_bounds:
+                    hit_goal = True
+                    if run != 0:
+                        self.runtimes.append(self.total_time - sum(self.runtimes))
+                        run_complete = True
+                        self.report("Goal found; run {} completed!".format(run))
+
+                yield StepEvent(self.total_time, run, tuple(location), heading,
+                                tuple(sensing), rotation, movement, wall_stop)
+                if run_complete:
+                    break
+
+
 if __name__ == '__main__':
     '''
     This script tests a robot based on the code in robot.py on a maze given
-    as an argument when running the script.
+    as an argument when running the script. With the --early-reset argument
+    the robot ends the first run once its known path is proven the shortest.
     '''
 
     # Create a maze based on input argument on command line.
@@ -28,89 +166,20 @@ if __name__ == '__main__':
     print testmaze.dim
 
     # Intitialize a robot; robot receives info about maze dimensions.
-    testrobot = Robot(testmaze.dim)
+    testrobot = Robot(testmaze.dim, early_reset='--early-reset' in sys.argv[1:])
 
     # Record robot performance over two runs.
-    runtimes = []
-    total_time = 0
-    for run in range(2):
-        print "Starting run {}.".format(run)
-
-        # Set the robot in the start position. Note that robot position
-        # parameters are independent of the robot itself.
-        robot_pos = {'location': [0, 0], 'heading': 'up'}
-
-        run_active = True
-        hit_goal = False
-        while run_active:
-            # check for end of time
-            total_time += 1
-            if total_time > max_time:
-                run_active = False
-                print "Allotted time exceeded."
-                break
-
-            # provide robot with sensor information, get actions
-            sensing = [testmaze.dist_to_wall(robot_pos['location'], heading)
-                       for heading in dir_sensors[robot_pos['heading']]]
-            rotation, movement = testrobot.next_move(sensing)
-
-            # check for a reset
-            if (rotation, movement) == ('Reset', 'Reset'):
-                if run == 0 and hit_goal:
-                    run_active = False
-                    runtimes.append(total_time)
-                    print "Ending first run. Starting next run."
-                    break
-                elif run == 0 and not hit_goal:
-                    print "Cannot reset - robot has not hit goal yet."
-                    continue
-                else:
-                    print "Cannot reset on runs after the first."
-                    continue
-
-            # perform rotation
-            if rotation == -90:
-                robot_pos['heading'] = dir_sensors[robot_pos['heading']][0]
-            elif rotation == 90:
-                robot_pos['heading'] = dir_sensors[robot_pos['heading']][2]
-            elif rotation == 0:
-                pass
-            else:
-                print "Invalid rotation value, no rotation performed."
-
-            # perform movement
-            if abs(movement) > 3:
-                print "Movement limited to three squares in a turn."
-            movement = max(min(int(movement), 3), -3) # fix to range [-3, 3]
-            while movement:
-                if movement > 0:
-                    if testmaze.is_permissible(robot_pos['location'], robot_pos['heading']):
-                        robot_pos['location'][0] += dir_move[robot_pos['heading']][0]
-                        robot_pos['location'][1] += dir_move[robot_pos['heading']][1]
-                        movement -= 1
-                    else:
-                        print "Movement stopped by wall."
-                        movement = 0
-                else:
-                    rev_heading = dir_reverse[robot_pos['heading']]
-                    if testmaze.is_permissible(robot_pos['location'], rev_heading):
-                        robot_pos['location'][0] += dir_move[rev_heading][0]
-                        robot_pos['location'][1] += dir_move[rev_heading][1]
-                        movement += 1
-                    else:
-                        print "Movement stopped by wall."
-                        movement = 0
-
-            # check for goal entered
-            goal_bounds = [testmaze.dim/2 - 1, testmaze.dim/2]
-            if robot_pos['location'][0] in goal_bounds and robot_pos['location'][1] in goal_bounds:
-                hit_goal = True
-                if run != 0:
-                    runtimes.append(total_time - sum(runtimes))
-                    run_active = False
-                    print "Goal found; run {} completed!".format(run)
+    simulator = Simulator(testmaze, testrobot, verbose=True)
+    for event in simulator.steps():
+        pass
 
     # Report score if robot is successful.
-    if len(runtimes) == 2:
-        print "Task complete! Score: {:4.3f}".format(runtimes[1] + train_score_mult*runtimes[0])
\ No newline at end of file
+    if simulator.score() is not None:
+        print "Task complete! Score: {:4.3f}".format(simulator.score())
+
+    # Compare with the best possible score.
+    if simulator.best_score() is not None:
+        print "Best possible score: {:4.3f} ({} actions to the goal).".format(
+            simulator.best_score(), testmaze.optimal_actions())
+        if simulator.score() is not None:
+            print "Optimality gap: {:4.3f}".format(simulator.score() - simulator.best_score())
\ No newline at end of file